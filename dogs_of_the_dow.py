@@ -10,7 +10,7 @@
  - Sell any holdings that drop out of the top 10
 
  Requirements:
- pip install alpaca-trade-api yfinance pandas numpy
+ pip install alpaca-trade-api yfinance pandas numpy requests orjson
 
  Setup:
  Set the following environment variables (or use a .env file):
@@ -29,11 +29,22 @@
 """
 
 import os
+import json
+import math
+import asyncio
+import logging
 import time
+import signal
+import pathlib
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import pandas as pd
 import yfinance as yf
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
 from alpaca_trade_api.rest import REST
 
 
@@ -48,255 +59,507 @@ BASE_URL = "https://paper-api.alpaca.markets"
 # Total USD to deploy across the 10 Dogs (match your paper account cash)
 TOTAL_PORTFOLIO_VALUE = 10_000 # USD
 
-# How often the bot wakes up to check if it's rebalance time (seconds)
-CHECK_INTERVAL = 60 * 60 * 24 # once per day
-
 # Rebalance during the first N days of January each year
 REBALANCE_MONTH = 1
 REBALANCE_DAY_WINDOW = 5 # Jan 1 - Jan 5
 
+# Longest single scheduler sleep (seconds). The wait timer is monotonic and
+# stalls while the host is suspended, so re-check the wall clock daily.
+MAX_WAIT = 60 * 60 * 24 # once per day
+
 # Set to True to force a rebalance every time the bot runs (useful for testing)
 FORCE_REBALANCE_ON_STARTUP = True
 
+# Dow components that currently pay no dividend - never fetched, ranked at 0%
+NON_DIVIDEND_PAYERS = frozenset({"BA", "INTC"})
+
+# Alpaca allows 200 requests/min - stay a little under it
+ORDER_RATE_LIMIT = 180 # orders per rolling 60 s
+ORDER_CONCURRENCY = 10 # orders in flight at once
+
+YAHOO_QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+YAHOO_COOKIE_URL = "https://fc.yahoo.com"
+YAHOO_CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+
+# On-disk caches of fetched market data, valid for the calendar day
+_YIELD_CACHE = pathlib.Path("~/.dogs_yield_cache.json").expanduser()
+_PRICE_CACHE = pathlib.Path("~/.dogs_price_cache.json").expanduser()
+
 
 # ---------------------------------------------------------------
 # DOW 30 COMPONENTS (update this list if the index changes)
 # ---------------------------------------------------------------
 
-DOW_30 = [
- "AAPL", "AMGN", "AXP", "BA", "CAT",
- "CRM", "CSCO", "CVX", "DIS", "DOW",
- "GS", "HD", "HON", "IBM", "INTC",
- "JNJ", "JPM", "KO", "MCD", "MMM",
- "MRK", "MSFT", "NKE", "PG", "TRV",
- "UNH", "V", "VZ", "WBA", "WMT",
-]
+DOW_30 = (
+    "AAPL", "AMGN", "AXP", "BA", "CAT",
+    "CRM", "CSCO", "CVX", "DIS", "DOW",
+    "GS", "HD", "HON", "IBM", "INTC",
+    "JNJ", "JPM", "KO", "MCD", "MMM",
+    "MRK", "MSFT", "NKE", "PG", "TRV",
+    "UNH", "V", "VZ", "WBA", "WMT",
+)
 
 
 # ---------------------------------------------------------------
-# ALPACA CLIENT
+# LOGGING (timestamps come from the handler's formatter)
 # ---------------------------------------------------------------
 
-api = REST(API_KEY, SECRET_KEY, BASE_URL)
+logger = logging.getLogger("dogs")
 
 
 # ---------------------------------------------------------------
-# HELPERS
+# HTTP SESSION (keep-alive connection pool for Yahoo)
 # ---------------------------------------------------------------
 
-def log(msg: str):
- """Timestamped print."""
- print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3,
+                      status_forcelist=[429, 500, 502, 503, 504]),
+))
+_session.headers.update({"User-Agent": "Mozilla/5.0", "Connection": "keep-alive"})
 
+# Yahoo's quote endpoint answers 401 without a session cookie + crumb
+_yahoo_crumb = None
 
-def get_dividend_yields(tickers: list) -> dict:
- """Return {ticker: dividend_yield} for each ticker via yfinance."""
- yields = {}
- for ticker in tickers:
- try:
- info = yf.Ticker(ticker).info
- div_yield = info.get("dividendYield") or 0.0
- yields[ticker] = div_yield
- except Exception as exc:
- log(f"  Could not fetch yield for {ticker}: {exc}")
- yields[ticker] = 0.0
- return yields
 
+# ---------------------------------------------------------------
+# ALPACA CLIENT
+# ---------------------------------------------------------------
+
+# REST keeps its own persistent session (so connections are reused) and
+# retries 429/504 itself - it deliberately does not share _session
+api = REST(API_KEY, SECRET_KEY, BASE_URL)
 
-def get_dogs(n: int = 10) -> list:
- """Return the top-n highest dividend yield Dow stocks."""
- log("Fetching dividend yields for all 30 Dow components...")
- yields = get_dividend_yields(DOW_30)
+# Submission times of recent orders, for the rolling-window rate limit
+_order_times = deque()
 
- ranked = sorted(yields.items(), key=lambda x: x[1], reverse=True)
 
- log(f"\n{'Rank':<6}{'Ticker':<8}{'Yield':>8}")
- log("-" * 24)
- for i, (ticker, y) in enumerate(ranked, 1):
- marker = " <- Dog" if i <= n else ""
- log(f" {i:<4}{ticker:<8}{y:>7.2%}{marker}")
+# ---------------------------------------------------------------
+# HELPERS
+# ---------------------------------------------------------------
 
- dogs = [t for t, _ in ranked[:n]]
- log(f"\n Selected Dogs: {dogs}\n")
- return dogs
+def _is_finite(value) -> bool:
+    """True for a real, finite number - the only values worth caching."""
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value))
+
+
+def _load_cache(path: pathlib.Path) -> dict:
+    """Read a JSON cache file, keeping only well-formed entries ({} on failure)."""
+    try:
+        with open(path) as fh:
+            cache = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return {t: entry for t, entry in cache.items()
+            if isinstance(entry, dict) and _is_finite(entry.get("value"))}
+
+
+def _save_cache(path: pathlib.Path, cache: dict):
+    """Atomically rewrite a JSON cache file."""
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp, "w") as fh:
+            json.dump(cache, fh, allow_nan=False)
+        os.replace(tmp, path)
+    except (OSError, ValueError) as exc:
+        logger.warning("  Could not write cache %s: %s", path, exc)
+
+
+def _cached_daily(path: pathlib.Path, tickers: list, fetch,
+                  today: str | None = None) -> dict:
+    """Return {ticker: value} from today's cache, calling fetch(stale) for the rest."""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    cache = _load_cache(path)
+    stale = [t for t in tickers if cache.get(t, {}).get("date") != today]
+    if stale:
+        for t, value in fetch(stale).items():
+            # A NaN/inf would otherwise be replayed all day - refetch it next time
+            if _is_finite(value):
+                cache[t] = {"date": today, "value": value}
+        _save_cache(path, cache)
+    return {t: cache[t]["value"] for t in tickers
+            if cache.get(t, {}).get("date") == today}
+
+
+def _fetch_yields_fallback(tickers: list) -> dict:
+    """Yields via yfinance's .info; failures omitted.
+
+    fast_info exposes no dividend yield, so the slow .info is unavoidable
+    here - which is why only tickers the batch request missed come through.
+    One yf.Tickers group shares a single session and crumb across tickers.
+    """
+    yields = {}
+    for ticker, t in yf.Tickers(" ".join(tickers)).tickers.items():
+        try:
+            yields[ticker] = t.info.get("trailingAnnualDividendYield") or 0.0
+        except Exception as exc:
+            logger.warning("  Could not fetch yield for %s: %s", ticker, exc)
+    return yields
+
+
+def _get_yahoo_crumb(refresh: bool = False) -> str:
+    """Return Yahoo's crumb token, setting the matching cookie on _session.
+
+    Same handshake yfinance uses: fc.yahoo.com sets the cookie (its status
+    code is irrelevant), then getcrumb returns the token tied to it.
+    """
+    global _yahoo_crumb
+    if _yahoo_crumb is None or refresh:
+        _session.cookies.clear()
+        try:
+            _session.get(YAHOO_COOKIE_URL, timeout=10, allow_redirects=True)
+        except requests.RequestException:
+            pass # cookie host is often blocklisted; getcrumb may still work
+        response = _session.get(YAHOO_CRUMB_URL, timeout=10, allow_redirects=True)
+        response.raise_for_status()
+        crumb = response.text.strip()
+        if not crumb or "<html>" in crumb:
+            raise RuntimeError("Yahoo returned no crumb")
+        _yahoo_crumb = crumb
+    return _yahoo_crumb
+
+
+def _fetch_dividend_yields(tickers: list) -> dict:
+    """Fetch yields in one batched quote request; failed tickers are omitted."""
+    yields = {}
+    try:
+        params = {"symbols": ",".join(tickers), "crumb": _get_yahoo_crumb()}
+        response = _session.get(YAHOO_QUOTE_URL, params=params, timeout=10)
+        if response.status_code == 401:
+            # Crumb expired with its cookie - redo the handshake once
+            params["crumb"] = _get_yahoo_crumb(refresh=True)
+            response = _session.get(YAHOO_QUOTE_URL, params=params, timeout=10)
+        response.raise_for_status()
+        result = orjson.loads(response.content)["quoteResponse"]["result"]
+        yields = {item["symbol"]: item.get("trailingAnnualDividendYield") or 0.0
+                  for item in result}
+    except Exception as exc:
+        logger.warning("  Could not fetch dividend yields: %s", exc)
+
+    # Only tickers the batch missed pay for a per-ticker lookup
+    missing = [t for t in tickers if t not in yields]
+    if missing:
+        yields.update(_fetch_yields_fallback(missing))
+    return yields
+
+
+def get_dividend_yields(tickers: list, today: str | None = None) -> dict:
+    """Return {ticker: dividend_yield} for each ticker via Yahoo Finance.
+
+    Yields already fetched today are served from _YIELD_CACHE, and
+    NON_DIVIDEND_PAYERS are skipped entirely.
+    """
+    to_fetch = [t for t in tickers if t not in NON_DIVIDEND_PAYERS]
+    yields = _cached_daily(_YIELD_CACHE, to_fetch, _fetch_dividend_yields, today)
+    return {t: yields.get(t, 0.0) for t in tickers}
+
+
+def get_dogs(n: int = 10, today: str | None = None) -> list:
+    """Return the top-n highest dividend yield Dow stocks."""
+    logger.info("Fetching dividend yields for all 30 Dow components...")
+    yields = get_dividend_yields(DOW_30, today)
+
+    tickers_arr = np.array(list(yields.keys()))
+    yields_arr = np.fromiter(yields.values(), dtype=np.float64, count=len(yields))
+
+    # O(N) selection of the top n, then sort just those for display.
+    # argpartition picks arbitrarily among yields tied at the cut-off, so
+    # rebuild the set: everything above the n-th yield, then ties in
+    # DOW_30 order - the same Dogs a stable full sort would choose.
+    n = min(n, len(yields_arr))
+    cutoff = yields_arr[np.argpartition(-yields_arr, n - 1)[n - 1]]
+    above = np.flatnonzero(yields_arr > cutoff)
+    ties = np.flatnonzero(yields_arr == cutoff)[:n - len(above)]
+    top_idx = np.concatenate((above, ties))
+    top_idx = top_idx[np.lexsort((top_idx, -yields_arr[top_idx]))]
+
+    logger.info("\n%-6s%-8s%8s", "Rank", "Ticker", "Yield")
+    logger.info("-" * 24)
+    for i, idx in enumerate(top_idx, 1):
+        logger.info(" %-4d%-8s%6.2f%% <- Dog", i, tickers_arr[idx], yields_arr[idx] * 100)
+
+    dogs = tickers_arr[top_idx].tolist()
+    logger.info("\n Selected Dogs: %s\n", dogs)
+    return dogs
 
 
 def get_latest_price(ticker: str) -> float | None:
- """Fetch the most recent closing price for a ticker."""
- try:
- df = yf.download(ticker, period="2d", interval="1d",
- progress=False, auto_adjust=True)
- if df.empty:
- return None
- return float(df["Close"].iloc[-1])
- except Exception as exc:
- log(f"  Price fetch failed for {ticker}: {exc}")
- return None
+    """Fetch the most recent closing price for a ticker."""
+    try:
+        df = yf.download(ticker, period="2d", interval="1d",
+                         progress=False, auto_adjust=True)
+        # Drop trailing NaN rows so a missing close never reaches sizing
+        close = df["Close"].dropna()
+        if close.empty:
+            return None
+        return float(np.ravel(close.values)[-1])
+    except Exception as exc:
+        logger.warning("  Price fetch failed for %s: %s", ticker, exc)
+        return None
+
+
+def _download_prices(tickers: list) -> dict:
+    """Return {ticker: latest close} for all tickers in one batched download."""
+    prices = {}
+    try:
+        px = yf.download(tickers=tickers, period="2d", interval="1d",
+                         progress=False, auto_adjust=True,
+                         group_by="ticker", threads=True)
+        for t in tickers:
+            if t in px.columns.levels[0]:
+                close = px[t]["Close"].dropna()
+                if not close.empty:
+                    prices[t] = float(close.values[-1])
+    except Exception as exc:
+        logger.warning("  Batch price fetch failed: %s", exc)
+
+    for t in tickers:
+        if t not in prices:
+            price = get_latest_price(t)
+            if price is not None:
+                prices[t] = price
+    return prices
+
+
+def get_latest_prices(tickers: list, today: str | None = None) -> dict:
+    """Return {ticker: latest close}, served from _PRICE_CACHE when fresh."""
+    return _cached_daily(_PRICE_CACHE, tickers, _download_prices, today)
 
 
 def get_all_positions() -> dict:
- """Return {symbol: qty} for all current Alpaca positions."""
- try:
- positions = api.list_positions()
- return {p.symbol: int(p.qty) for p in positions}
- except Exception as exc:
- log(f" Could not fetch positions: {exc}")
- return {}
+    """Return {symbol: qty} for all current Alpaca positions."""
+    try:
+        # Raw GET returns plain dicts, skipping list_positions' construction
+        # of a full Position object per holding - we only need symbol and qty
+        positions = api.get("/positions")
+        return {p["symbol"]: int(p["qty"]) for p in positions}
+    except Exception as exc:
+        logger.warning(" Could not fetch positions: %s", exc)
+        return {}
 
 
 def get_account_cash() -> float:
- """Return available buying power from the Alpaca account."""
- try:
- account = api.get_account()
- return float(account.buying_power)
- except Exception as exc:
- log(f" Could not fetch account info: {exc}")
- return 0.0
+    """Return available buying power from the Alpaca account."""
+    try:
+        account = api.get_account()
+        return float(account.buying_power)
+    except Exception as exc:
+        logger.warning(" Could not fetch account info: %s", exc)
+        return 0.0
 
 
 def place_order(symbol: str, qty: int, side: str):
- """Submit a market order. side = 'buy' | 'sell'."""
- if qty < 1:
- log(f"  Skipping {symbol} - computed qty < 1")
- return
- try:
- api.submit_order(
- symbol=symbol,
- qty=qty,
- side=side,
- type="market",
- time_in_force="gtc",
- )
- action = "Bought" if side == "buy" else "Sold"
- log(f" {action} {qty} share(s) of {symbol}")
- except Exception as exc:
- log(f" Order failed for {symbol} ({side} {qty}): {exc}")
+    """Submit a market order. side = 'buy' | 'sell'. Returns the order or None."""
+    if qty < 1:
+        logger.info("  Skipping %s - computed qty < 1", symbol)
+        return None
+    try:
+        order = api.submit_order(
+            symbol=symbol,
+            qty=qty,
+            side=side,
+            type="market",
+            time_in_force="gtc",
+        )
+        action = "Bought" if side == "buy" else "Sold"
+        logger.info(" %s %d share(s) of %s", action, qty, symbol)
+        return order
+    except Exception as exc:
+        logger.warning(" Order failed for %s (%s %d): %s", symbol, side, qty, exc)
+        return None
+
+
+async def _throttle():
+    """Wait until another order fits under ORDER_RATE_LIMIT per minute."""
+    while True:
+        now = time.monotonic()
+        while _order_times and now - _order_times[0] >= 60:
+            _order_times.popleft()
+        if len(_order_times) < ORDER_RATE_LIMIT:
+            _order_times.append(now)
+            return
+        await asyncio.sleep(60 - (now - _order_times[0]))
+
+
+async def _submit_order(sem: asyncio.Semaphore, symbol: str, qty: int, side: str):
+    """place_order behind the rate limiter, off the event loop thread."""
+    async with sem:
+        await _throttle()
+        return await asyncio.to_thread(place_order, symbol, qty, side)
 
 
 # ---------------------------------------------------------------
 # REBALANCE LOGIC
 # ---------------------------------------------------------------
 
-def rebalance():
- """
- Core Dogs of the Dow rebalance:
- 1. Identify the 10 Dogs (highest yield Dow stocks)
- 2. Sell any current holdings NOT in the Dogs list
- 3. Buy / adjust Dogs to equal-weight target
- """
- log("=" * 60)
- log(" Starting Dogs of the Dow Rebalance")
- log("=" * 60)
-
- dogs = get_dogs(n=10)
- target_per_stock = TOTAL_PORTFOLIO_VALUE / len(dogs)
- current_positions = get_all_positions()
-
- # -- Step 1: Liquidate non-Dog holdings ----------------------
- log(" Selling positions NOT in this year's Dogs list...")
- sold_any = False
- for symbol, qty in current_positions.items():
- if symbol not in dogs:
- log(f" {symbol} is no longer a Dog - selling {qty} share(s)")
- place_order(symbol, qty, "sell")
- time.sleep(1)
- sold_any = True
- if not sold_any:
- log(" (No non-Dog positions to sell)")
-
- # Brief pause to let sell orders settle in paper trading
- if sold_any:
- log(" Waiting 5 s for sell orders to process...")
- time.sleep(5)
-
- # Refresh positions after sells
- current_positions = get_all_positions()
-
- # -- Step 2: Buy / trim each Dog to target weight -------------
- log("\n Adjusting Dogs positions to equal-weight targets...")
- for ticker in dogs:
- price = get_latest_price(ticker)
- if price is None:
- log(f"  No price for {ticker} - skipping")
- continue
-
- target_shares = int(target_per_stock // price)
- current_qty = current_positions.get(ticker, 0)
- diff = target_shares - current_qty
-
- log(f" {ticker:<6} price=${price:>8.2f} "
- f"target={target_shares} current={current_qty} diff={diff:+d}")
-
- if diff > 0:
- place_order(ticker, diff, "buy")
- elif diff < 0:
- place_order(ticker, abs(diff), "sell")
- else:
- log(f" Already at target - no action needed")
-
- time.sleep(1) # avoid rate limits
-
- log("\n Rebalance complete!")
- log(f" Portfolio target: ${TOTAL_PORTFOLIO_VALUE:,.2f} "
- f"| ~${target_per_stock:,.2f} per stock")
- log("=" * 60 + "\n")
-
-
-# ---------------------------------------------------------------
-# REBALANCE SCHEDULE
-# ---------------------------------------------------------------
-
-def is_rebalance_day() -> bool:
- """True during the first REBALANCE_DAY_WINDOW days of January."""
- today = datetime.now()
- return (
- today.month == REBALANCE_MONTH
- and 1 <= today.day <= REBALANCE_DAY_WINDOW
- )
+async def rebalance():
+    """
+    Core Dogs of the Dow rebalance:
+    1. Identify the 10 Dogs (highest yield Dow stocks)
+    2. Sell any current holdings NOT in the Dogs list
+    3. Buy / adjust Dogs to equal-weight target
+    """
+    logger.info("=" * 60)
+    logger.info(" Starting Dogs of the Dow Rebalance")
+    logger.info("=" * 60)
+
+    # Sample the clock once; every cache lookup below keys off this date
+    today = datetime.now().strftime("%Y-%m-%d")
+    sem = asyncio.Semaphore(ORDER_CONCURRENCY)
+
+    # Yields and positions are independent - fetch them side by side
+    dogs, current_positions = await asyncio.gather(
+        asyncio.to_thread(get_dogs, 10, today),
+        asyncio.to_thread(get_all_positions),
+    )
+    dogs_set = frozenset(dogs)
+    target_per_stock = TOTAL_PORTFOLIO_VALUE / len(dogs)
+
+    # Prices download in the background while the sells go out
+    prices_task = asyncio.create_task(asyncio.to_thread(get_latest_prices, dogs, today))
+
+    # -- Step 1: Liquidate non-Dog holdings ----------------------
+    logger.info(" Selling positions NOT in this year's Dogs list...")
+    to_sell = [(symbol, qty) for symbol, qty in current_positions.items()
+               if symbol not in dogs_set]
+    for symbol, qty in to_sell:
+        logger.info(" %s is no longer a Dog - selling %d share(s)", symbol, qty)
+    sell_orders = await asyncio.gather(
+        *[_submit_order(sem, symbol, qty, "sell") for symbol, qty in to_sell])
+    if not to_sell:
+        logger.info(" (No non-Dog positions to sell)")
+
+    # Brief pause to let sell orders settle in paper trading
+    if to_sell:
+        logger.info(" Waiting 5 s for sell orders to process...")
+        await asyncio.sleep(5)
+
+    # Drop the liquidated positions locally rather than re-listing them
+    for (symbol, _), order in zip(to_sell, sell_orders):
+        if order is not None:
+            current_positions.pop(symbol, None)
+
+    # -- Step 2: Buy / trim each Dog to target weight -------------
+    logger.info("\n Adjusting Dogs positions to equal-weight targets...")
+    prices_dict = await prices_task
+    # Only finite, positive prices may be sized - NaN/inf/0 would cast to
+    # INT64_MIN below and turn into an absurd order instead of an error
+    priced = []
+    for ticker in dogs:
+        price = prices_dict.get(ticker)
+        if price is None or not np.isfinite(price) or price <= 0:
+            logger.warning("  No price for %s - skipping", ticker)
+        else:
+            priced.append(ticker)
+
+    # Size every Dog in one vectorized pass
+    prices = np.array([prices_dict[t] for t in priced], dtype=np.float64)
+    targets = (target_per_stock // prices).astype(np.int64)
+    current = np.array([current_positions.get(t, 0) for t in priced], dtype=np.int64)
+    diffs = targets - current
+
+    orders = []
+    for ticker, price, target_shares, current_qty, diff in zip(
+            priced, prices.tolist(), targets.tolist(), current.tolist(), diffs.tolist()):
+        logger.info(" %-6s price=$%8.2f target=%d current=%d diff=%+d",
+                    ticker, price, target_shares, current_qty, diff)
+
+        if diff > 0:
+            orders.append(_submit_order(sem, ticker, diff, "buy"))
+        elif diff < 0:
+            orders.append(_submit_order(sem, ticker, abs(diff), "sell"))
+        else:
+            logger.info(" Already at target - no action needed")
+    await asyncio.gather(*orders)
+
+    logger.info("\n Rebalance complete!")
+    logger.info(" Portfolio target: $%s | ~$%s per stock",
+                f"{TOTAL_PORTFOLIO_VALUE:,.2f}", f"{target_per_stock:,.2f}")
+    logger.info("=" * 60 + "\n")
 
 
 # ---------------------------------------------------------------
 # MAIN LOOP
 # ---------------------------------------------------------------
 
-def main():
- log(" Dogs of the Dow - Alpaca Paper Trading Bot")
- log(f" Portfolio size : ${TOTAL_PORTFOLIO_VALUE:,.2f}")
- log(f" Rebalance window: Jan 1-{REBALANCE_DAY_WINDOW}")
- log(f" Force on startup: {FORCE_REBALANCE_ON_STARTUP}\n")
-
- # Validate API connection
- try:
- account = api.get_account()
- log(f" Connected to Alpaca - Account status: {account.status}")
- log(f" Buying power: ${float(account.buying_power):,.2f}\n")
- except Exception as exc:
- log(f" Cannot connect to Alpaca: {exc}")
- log(" Check your API_KEY, SECRET_KEY, and BASE_URL.")
- return
-
- last_rebalance_year = None
-
- # Immediate rebalance on startup for easy testing
- if FORCE_REBALANCE_ON_STARTUP:
- log(" FORCE_REBALANCE_ON_STARTUP is True - rebalancing now...")
- rebalance()
- last_rebalance_year = datetime.now().year
-
- # Main scheduling loop
- while True:
- current_year = datetime.now().year
-
- if is_rebalance_day() and last_rebalance_year != current_year:
- log(" It's rebalance season! Starting annual rebalance...")
- rebalance()
- last_rebalance_year = current_year
- else:
- next_year = current_year if is_rebalance_day() else current_year + 1
- log(f" Holding. Next scheduled rebalance: Jan 1, {next_year}")
-
- time.sleep(CHECK_INTERVAL)
+async def main():
+    logger.info(" Dogs of the Dow - Alpaca Paper Trading Bot")
+    logger.info(" Portfolio size : $%s", f"{TOTAL_PORTFOLIO_VALUE:,.2f}")
+    logger.info(" Rebalance window: Jan 1-%d", REBALANCE_DAY_WINDOW)
+    logger.info(" Force on startup: %s\n", FORCE_REBALANCE_ON_STARTUP)
+
+    # Validate API connection
+    try:
+        acct = await asyncio.to_thread(api.get_account)
+        status, bp = acct.status, float(acct.buying_power)
+        logger.info(" Connected to Alpaca - Account status: %s", status)
+        logger.info(" Buying power: $%s\n", f"{bp:,.2f}")
+    except Exception as exc:
+        logger.error(" Cannot connect to Alpaca: %s", exc)
+        logger.error(" Check your API_KEY, SECRET_KEY, and BASE_URL.")
+        return
+
+    # SIGTERM wakes the scheduler immediately instead of after the wait; set
+    # up before the startup rebalance so it is honoured once that finishes
+    _stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, _stop.set)
+    except NotImplementedError:
+        # Windows event loops have no add_signal_handler
+        signal.signal(signal.SIGTERM, lambda *_: loop.call_soon_threadsafe(_stop.set))
+
+    # This year's rebalance is still due if we're not past its window
+    window = timedelta(days=REBALANCE_DAY_WINDOW)
+    now = datetime.now()
+    next_rebalance = datetime(now.year, REBALANCE_MONTH, 1)
+    if now >= next_rebalance + window:
+        next_rebalance = datetime(now.year + 1, REBALANCE_MONTH, 1)
+
+    # Immediate rebalance on startup for easy testing
+    if FORCE_REBALANCE_ON_STARTUP:
+        logger.info(" FORCE_REBALANCE_ON_STARTUP is True - rebalancing now...")
+        await rebalance()
+        next_rebalance = datetime(now.year + 1, REBALANCE_MONTH, 1)
+
+    # Main scheduling loop - waits in chunks of at most MAX_WAIT until the
+    # next rebalance is due
+    announced = None
+    while not _stop.is_set():
+        now = datetime.now()
+        if now >= next_rebalance + window:
+            # Woke too late (e.g. host suspended through January) - same
+            # rule as at startup: no trading outside the window
+            logger.warning(" Missed the Jan 1-%d window - skipping the %d rebalance",
+                           REBALANCE_DAY_WINDOW, next_rebalance.year)
+            next_rebalance = datetime(now.year, REBALANCE_MONTH, 1)
+            if now >= next_rebalance + window:
+                next_rebalance = datetime(now.year + 1, REBALANCE_MONTH, 1)
+            continue
+        if now >= next_rebalance:
+            logger.info(" It's rebalance season! Starting annual rebalance...")
+            await rebalance()
+            next_rebalance = datetime(next_rebalance.year + 1, REBALANCE_MONTH, 1)
+
+        if announced != next_rebalance:
+            logger.info(" Holding. Next scheduled rebalance: Jan 1, %d", next_rebalance.year)
+            announced = next_rebalance
+
+        remaining = (next_rebalance - datetime.now()).total_seconds()
+        try:
+            await asyncio.wait_for(_stop.wait(), timeout=min(max(remaining, 0), MAX_WAIT))
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info(" Stop requested - shutting down.")
 
 
 if __name__ == "__main__":
- main()
+    logging.basicConfig(format="[%(asctime)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
+    asyncio.run(main())